@@ -3,24 +3,57 @@
 import argparse
 import sys
 import base64
-from dataclasses import dataclass
-from typing import Any
+import binascii
+import io
+import mmap
+import os
+import stat
+import threading
+from typing import TYPE_CHECKING, Any, Callable, NoReturn, TypeVar
 
-import requests
 import rapidjson as json
 
+if TYPE_CHECKING:
+    import requests
+
+T = TypeVar("T")
+
 REQUEST_TIMEOUT = 60
+# maximum number of connections to the REST-Agent kept open for reuse
+MAX_CONNECTIONS = 16
+# upper bound for the combined size of payloads in flight when sending
+# bundles concurrently, each request holds its own encoded copy of the payload
+MAX_CONCURRENT_PAYLOAD_BYTES = 64 * 1024 * 1024
+
+# translation table which removes path separators from bundle file names
+_STRIP_SLASHES = str.maketrans("", "", "/")
+
+_session: "requests.Session | None" = None
+_session_lock = threading.Lock()
 
 
-@dataclass()
 class RESTError(Exception):
-    status_code: int
-    error: str
+    def __init__(self, status_code: int, error: str) -> None:
+        super().__init__(status_code, error)
+        self.status_code = status_code
+        self.error = error
 
     def __str__(self) -> str:
         return f"RESTError happened: {self.status_code} - {self.error}"
 
 
+def encode_payload(contents: bytes | mmap.mmap) -> str:
+    """Encodes raw payload so that it can be transmitted to the REST-Agent
+
+    Args:
+        contents (bytes | mmap.mmap): Raw payload
+
+    Returns:
+        str: Payload encoded as base64
+    """
+    return base64.b64encode(contents).decode("ascii")
+
+
 def load_payload(path: str) -> str:
     """Loads payload from specified file
 
@@ -31,25 +64,156 @@ def load_payload(path: str) -> str:
         str: Content of payload file (encoded as base64 ist content was binary)
     """
     with open(path, "rb") as f:
-        contents: bytes = f.read()
-        return str(base64.b64encode(contents), encoding="utf-8")
+        info = os.fstat(f.fileno())
+        # empty files and non-regular files such as pipes can not be mapped
+        if not stat.S_ISREG(info.st_mode) or info.st_size == 0:
+            return encode_payload(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as contents:
+            return encode_payload(contents)
 
 
 def dump_payload(path: str, payload: str) -> None:
-    with open(path, "wb") as f:
-        f.write(base64.b64decode(bytes(payload, encoding="utf-8")))
+    # a2b_base64 reads an ASCII str in place, b64decode would copy it to bytes first
+    contents = memoryview(binascii.a2b_base64(payload))
+    # the payload is written in one go, so a buffered file object is of no use
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        while contents:
+            contents = contents[os.write(fd, contents) :]
+    finally:
+        os.close(fd)
+
+
+def _encode_request(data: dict[str, Any]) -> bytes:
+    """Serialises a request body for the REST-Agent
+
+    The JSON is written straight into a byte buffer, so large payloads are not
+    first materialised as a str and then copied again when the HTTP library
+    encodes the body.
+
+    Args:
+        data: Request which should be sent
+
+    Returns:
+        bytes: JSON encoded request
+    """
+    buffer = io.BytesIO()
+    json.dump(data, buffer)
+    return buffer.getvalue()
+
+
+def _get_session() -> "requests.Session":
+    """Returns the HTTP session shared by all calls to the REST-Agent
+
+    The session keeps the connection to the agent alive, so consecutive calls
+    do not pay for a new TCP connection each.
+    """
+    global _session
+    # read the global only once, close_session may reset it at any time
+    session = _session
+    if session is None:
+        with _session_lock:
+            session = _session
+            if session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                session.mount(
+                    "http://",
+                    HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONNECTIONS),
+                )
+                _session = session
+    return session
+
+
+def close_session() -> None:
+    """Closes the connections kept open to the REST-Agent
+
+    The next call to the agent will transparently open a new connection.
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
 
 
 def build_url(address: str, port: int) -> str:
     return f"http://{address}:{port}/rest"
 
 
+def _post(rest_url: str, action: str, data: dict[str, Any]) -> dict[str, Any]:
+    """Sends a request to the REST-Agent and checks its reply
+
+    Args:
+        rest_url: Address + Port+ Prefix for REST actions
+        action: Name of the REST action, e.g. "register"
+        data: Request which should be sent
+
+    Returns:
+        Unmarshaled JSON reply of the agent
+
+    Raises:
+        RESTError if the agent rejected the request
+    """
+    response: requests.Response = _get_session().post(
+        f"{rest_url}/{action}", data=_encode_request(data), timeout=REQUEST_TIMEOUT
+    )
+    if response.status_code != 200:
+        raise RESTError(status_code=response.status_code, error=response.text)
+
+    parsed_response = json.loads(response.content)
+    if parsed_response["error"]:
+        raise RESTError(
+            status_code=response.status_code, error=parsed_response["error"]
+        )
+
+    return parsed_response
+
+
 def load_registration_data(path: str) -> dict[str, str]:
     with open(path, "r") as f:
         ids: dict[str, str] = json.load(f)
         return ids
 
 
+def _call_concurrently(
+    function: Callable[..., T],
+    calls: list[dict[str, Any]],
+    max_workers: int = MAX_CONNECTIONS,
+) -> list[T]:
+    """Calls a function once per set of keyword arguments, using a thread pool
+
+    At most max_workers calls run at the same time. It must not exceed
+    MAX_CONNECTIONS, so that each call can use its own pooled connection to
+    the REST-Agent.
+
+    Args:
+        function: Function to call
+        calls: Keyword arguments for each call
+        max_workers: Maximum number of concurrent calls, with 1 the calls are
+                     made one after another in the calling thread
+
+    Returns:
+        Return values of the calls, in the same order as the arguments
+
+    Raises:
+        If any call fails, the remaining calls still run to completion. Then the
+        exception of the failed call which comes first in the order of the
+        arguments is re-raised. Exceptions of other failed calls are discarded,
+        and the return values of successful calls are lost.
+    """
+    if len(calls) <= 1 or max_workers <= 1:
+        return [function(**kwargs) for kwargs in calls]
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=min(len(calls), max_workers)) as pool:
+        futures = [pool.submit(function, **kwargs) for kwargs in calls]
+    return [future.result() for future in futures]
+
+
 def register(
     rest_url: str, endpoint_id: str, registration_data_file: str = ""
 ) -> dict[str, str]:
@@ -68,19 +232,9 @@ def register(
     Raises:
         RESTError if anything goes wrong
     """
-    id_json = json.dumps({"endpoint_id": endpoint_id})
-    response: requests.Response = requests.post(
-        f"{rest_url}/register", data=id_json, timeout=REQUEST_TIMEOUT
+    parsed_response = _post(
+        rest_url=rest_url, action="register", data={"endpoint_id": endpoint_id}
     )
-    if response.status_code != 200:
-        raise RESTError(status_code=response.status_code, error=response.text)
-
-    parsed_response = response.json()
-    if parsed_response["error"]:
-        raise RESTError(
-            status_code=response.status_code, error=parsed_response["error"]
-        )
-
     data = {"endpoint_id": endpoint_id, "uuid": parsed_response["uuid"]}
     marshaled = json.dumps(data)
     if registration_data_file:
@@ -89,6 +243,44 @@ def register(
     return data
 
 
+def register_many(rest_url: str, endpoint_ids: list[str]) -> list[dict[str, str]]:
+    """Registers multiple endpoint IDs with the REST Application Agent
+
+    The registrations are performed concurrently over the pooled connections
+    to the agent.
+
+    Args:
+        rest_url: Address + Port+ Prefix for REST actions
+        endpoint_ids: BPv7 endpoint IDs used for registration
+
+    Returns:
+        Registration data for each endpoint ID, in the same order,
+        see register for the format
+
+    Raises:
+        RESTError if any of the registrations failed. All other registrations
+        are still performed, but partial success is not reported: the uuids
+        of the successful registrations are not returned.
+    """
+    return _call_concurrently(
+        register,
+        [
+            {"rest_url": rest_url, "endpoint_id": endpoint_id}
+            for endpoint_id in endpoint_ids
+        ],
+    )
+
+
+def _fail(message: str) -> NoReturn:
+    """Report an error to the user and exit
+
+    Args:
+        message: Error message, written to stderr
+    """
+    print(message, file=sys.stderr, flush=True)
+    sys.exit(1)
+
+
 def _cli_register(rest_url: str, args: argparse.Namespace) -> None:
     """Perform registration with CLI-arguments
 
@@ -101,12 +293,7 @@ def _cli_register(rest_url: str, args: argparse.Namespace) -> None:
 
     """
     if not args.eid:
-        print(
-            "Must provide Endpoint ID",
-            file=sys.stderr,
-            flush=True,
-        )
-        sys.exit(1)
+        _fail("Must provide Endpoint ID")
 
     registration_data = register(
         rest_url=rest_url,
@@ -132,29 +319,13 @@ def fetch_pending(rest_url: str, uuid: str) -> list[dict[str, Any]]:
     Raises:
         RESTError if anything goes wrong
     """
-    response: requests.Response = requests.post(
-        f"{rest_url}/fetch", data=json.dumps({"uuid": uuid}), timeout=REQUEST_TIMEOUT
-    )
-    if response.status_code != 200:
-        raise RESTError(status_code=response.status_code, error=response.text)
-
-    parsed_response = response.json()
-    if parsed_response["error"]:
-        raise RESTError(
-            status_code=response.status_code, error=parsed_response["error"]
-        )
-
+    parsed_response = _post(rest_url=rest_url, action="fetch", data={"uuid": uuid})
     return parsed_response["bundles"]
 
 
 def _cli_fetch_pending(rest_url: str, args: argparse.Namespace) -> None:
     if not args.registration_file and not args.uuid:
-        print(
-            "Must provide either registration file or uuid",
-            file=sys.stderr,
-            flush=True,
-        )
-        sys.exit(1)
+        _fail("Must provide either registration file or uuid")
 
     if args.registration_file:
         uuid = load_registration_data(args.registration_file)["uuid"]
@@ -165,26 +336,12 @@ def _cli_fetch_pending(rest_url: str, args: argparse.Namespace) -> None:
 
     for bundle in pending:
         filename = f"{bundle['primaryBlock']['destination']}-{bundle['primaryBlock']['creationTimestamp']['date']}"
-        filename = filename.replace("/", "")
+        filename = filename.translate(_STRIP_SLASHES)
         for block in bundle["canonicalBlocks"]:
             if block["blockTypeCode"] == 1:
                 dump_payload(path=filename, payload=block["data"])
 
 
-def _submit_bundle(rest_url: str, data: dict[str, Any]) -> None:
-    response: requests.Response = requests.post(
-        f"{rest_url}/build", data=json.dumps(data), timeout=REQUEST_TIMEOUT
-    )
-    if response.status_code != 200:
-        raise RESTError(status_code=response.status_code, error=response.text)
-
-    parsed_response = response.json()
-    if parsed_response["error"]:
-        raise RESTError(
-            status_code=response.status_code, error=parsed_response["error"]
-        )
-
-
 def send_bundle(
     rest_url: str,
     uuid: str,
@@ -217,25 +374,49 @@ def send_bundle(
             "payload_block": payload,
         },
     }
-    _submit_bundle(rest_url=rest_url, data=data)
+    _post(rest_url=rest_url, action="build", data=data)
+
+
+def send_bundles(rest_url: str, uuid: str, bundles: list[dict[str, str]]) -> None:
+    """Sends multiple bundles via the REST application agent
+
+    The REST-Agent only accepts one bundle per request, so the requests are
+    issued concurrently over the pooled connections to the agent.
+
+    Every request in flight holds its own encoded copy of its payload. The
+    number of concurrent requests is therefore limited so that at most
+    MAX_CONCURRENT_PAYLOAD_BYTES of payload are in flight, bundles with
+    payloads larger than that are sent one after another.
+
+    Args:
+        rest_url: http:// + Address + Port+ Prefix for REST actions
+        uuid: Authentication token received via the register-method.
+        bundles: One dictionary per bundle, containing the keyword arguments
+                 "source", "destination", "payload" and optionally "lifetime"
+                 as accepted by send_bundle
+
+    Raises:
+        RESTError if sending any of the bundles failed. All other bundles are
+        still sent, but partial success is not reported: the exception does
+        not tell which bundles were sent.
+    """
+    largest_payload = max((len(bundle["payload"]) for bundle in bundles), default=0)
+    _call_concurrently(
+        send_bundle,
+        [{"rest_url": rest_url, "uuid": uuid, **bundle} for bundle in bundles],
+        max_workers=max(
+            1,
+            min(
+                MAX_CONNECTIONS,
+                MAX_CONCURRENT_PAYLOAD_BYTES // max(largest_payload, 1),
+            ),
+        ),
+    )
 
 
 def _cli_send_bundle(rest_url: str, args: argparse.Namespace) -> None:
     if not args.registration_file and not (args.endpoint_id and args.uuid):
-        print(
-            "Must provide either registration file OR (EndpointID AND uuid)",
-            file=sys.stderr,
-            flush=True,
-        )
-        sys.exit(1)
-
-    if not args.destination:
-        print(
-            "Must provide bundle destination",
-            file=sys.stderr,
-            flush=True,
-        )
-        sys.exit(1)
+        _fail("Must provide either registration file OR (EndpointID AND uuid)")
 
     if args.registration_file:
         reg_data = load_registration_data(args.registration_file)
@@ -250,38 +431,34 @@ def _cli_send_bundle(rest_url: str, args: argparse.Namespace) -> None:
     else:
         payload = sys.stdin.read()
 
-    send_bundle(
+    send_bundles(
         rest_url=rest_url,
         uuid=uuid,
-        source=source,
-        destination=args.destination,
-        payload=payload,
-        lifetime=args.lifetime,
+        bundles=[
+            {
+                "source": source,
+                "destination": destination,
+                "payload": payload,
+                "lifetime": args.lifetime,
+            }
+            for destination in args.destination
+        ],
     )
 
 
 def _cli_no_command(rest_url: str, args: argparse.Namespace) -> None:
-    print(
-        "Must choose a command",
-        file=sys.stderr,
-        flush=True,
-    )
-    sys.exit(1)
+    _fail("Must choose a command")
 
 
-def main() -> None:
-    parser = argparse.ArgumentParser(description="Interact with dtnd")
-    parser.add_argument(
-        "-a", "--address", default="localhost", help="Address of the REST-Agent"
-    )
-    parser.add_argument(
-        "-p", "--port", type=int, default=8080, help="Port of the REST-Agent"
-    )
-    parser.set_defaults(func=_cli_no_command)
+COMMAND_HELP = {
+    "register": "Register with dtnd",
+    "fetch": "Fetch bundles for our Endpoint-ID",
+    "send": "Send bundle",
+}
 
-    subparsers = parser.add_subparsers(help="Commands")
 
-    register_parser = subparsers.add_parser("register", help="Register with dtnd")
+def _build_register(subparsers: argparse._SubParsersAction) -> None:
+    register_parser = subparsers.add_parser("register", help=COMMAND_HELP["register"])
     register_parser.set_defaults(func=_cli_register)
     register_parser.add_argument("eid", help="Endpoint ID for registration")
     register_parser.add_argument(
@@ -291,9 +468,9 @@ def main() -> None:
         help="Write registration data to a file",
     )
 
-    fetch_parser = subparsers.add_parser(
-        "fetch", help="Fetch bundles for our Endpoint-ID"
-    )
+
+def _build_fetch(subparsers: argparse._SubParsersAction) -> None:
+    fetch_parser = subparsers.add_parser("fetch", help=COMMAND_HELP["fetch"])
     fetch_parser.add_argument(
         "-r", "--registration_file", default="", help="Load registration data from file"
     )
@@ -302,7 +479,9 @@ def main() -> None:
     )
     fetch_parser.set_defaults(func=_cli_fetch_pending)
 
-    send_parser = subparsers.add_parser("send", help="Send bundle")
+
+def _build_send(subparsers: argparse._SubParsersAction) -> None:
+    send_parser = subparsers.add_parser("send", help=COMMAND_HELP["send"])
     send_parser.add_argument(
         "-r", "--registration_file", default="", help="Load registration data from file"
     )
@@ -316,9 +495,88 @@ def main() -> None:
     send_parser.add_argument(
         "-l", "--lifetime", default="24h", help="Lifetime of bundle"
     )
-    send_parser.add_argument("destination", help="Endpoint ID of recipient")
+    send_parser.add_argument(
+        "destination",
+        nargs="+",
+        help="Endpoint ID(s) of recipient(s). Each recipient is sent its own copy "
+        "of the payload, up to 64 MiB of payload copies are held in memory "
+        "concurrently, larger payloads are sent to one recipient at a time",
+    )
     send_parser.set_defaults(func=_cli_send_bundle)
 
+
+SUBCOMMANDS = {
+    "register": _build_register,
+    "fetch": _build_fetch,
+    "send": _build_send,
+}
+
+# global options which consume the following argument
+_GLOBAL_SHORT_OPTIONS_WITH_VALUE = {"-a", "-p"}
+_GLOBAL_LONG_OPTIONS_WITH_VALUE = ("--address", "--port")
+
+
+def _takes_value(arg: str) -> bool:
+    """Check whether a command line argument is a global option followed by its value
+
+    Like argparse, long options are also recognised when abbreviated to an
+    unambiguous prefix, e.g. "--addr". Options written as "--address=value"
+    carry their value themselves.
+    """
+    if arg in _GLOBAL_SHORT_OPTIONS_WITH_VALUE:
+        return True
+    if len(arg) <= 2 or not arg.startswith("--") or "=" in arg:
+        return False
+    matches = [
+        option for option in _GLOBAL_LONG_OPTIONS_WITH_VALUE if option.startswith(arg)
+    ]
+    return len(matches) == 1
+
+
+def _selected_command(argv: list[str]) -> str:
+    """Find the subcommand the user selected without invoking the full parser
+
+    The selected command is the first argument which is exactly the name of a
+    subcommand and is not the value of a global option.
+
+    Args:
+        argv: Command line arguments without the program name
+
+    Returns:
+        Name of the selected subcommand, or an empty string if there is none
+    """
+    skip_next = False
+    for arg in argv:
+        if skip_next:
+            skip_next = False
+        elif _takes_value(arg):
+            skip_next = True
+        elif arg in SUBCOMMANDS:
+            return arg
+    return ""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Interact with dtnd")
+    parser.add_argument(
+        "-a", "--address", default="localhost", help="Address of the REST-Agent"
+    )
+    parser.add_argument(
+        "-p", "--port", type=int, default=8080, help="Port of the REST-Agent"
+    )
+    parser.set_defaults(func=_cli_no_command)
+
+    subparsers = parser.add_subparsers(help="Commands")
+
+    # only fully build the subparser that is actually going to be used,
+    # the others are registered as stubs so that they still show up in the help
+    selected = _selected_command(sys.argv[1:])
+    for command, build in SUBCOMMANDS.items():
+        if command == selected:
+            build(subparsers)
+        else:
+            subparsers.add_parser(command, help=COMMAND_HELP[command], add_help=False)
+
     args = parser.parse_args()
 
     rest_url = build_url(address=args.address, port=args.port)